@@ -2,9 +2,10 @@
 import asyncio
 
 import os
+import sys
 
-# Used for type hints (Optional[ClientSession])
-from typing import Optional
+# Used for type hints (Optional[ClientSession], Callable for the streaming callback)
+from typing import Callable, Optional
 
 # Safely manages multiple async resources
 # Ensures MCP session, stdio connection, etc are cleanly closed on exit
@@ -17,29 +18,126 @@ from contextlib import AsyncExitStack
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
 
+# Optional faster event loop (libuv based) for all async I/O
+# Not available on Windows, falls back to the default asyncio loop there
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
 
 from google import genai
 from google.genai import types
 
+# Fast JSON parser, used to decode batched answers (see process_queries)
+import orjson
+
 # loads environment variables from a .env file
 # project id and location for vertex ai LLM calls
 from dotenv import load_dotenv
 load_dotenv()  
 
+# Max number of MCP tool calls executed concurrently per Gemini turn
+MAX_CONCURRENT_TOOL_CALLS = 8
+
+
+# Vertex AI Gemini client shared by every MCPClient created on the same event loop
+# building it resolves credentials and sets up HTTP connection pools, so do it once per loop
+# the async connection pool is bound to the loop it first runs on, so a new event loop
+# (e.g. another asyncio.run in a test harness) gets a new client instead of the cached one
+_genai_client_cache: Optional[tuple[asyncio.AbstractEventLoop, genai.Client]] = None
+
+
+def _genai_client() -> genai.Client:
+    global _genai_client_cache
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # no running loop: we can't tell which loop will use the client, so don't share it
+        loop = None
+
+    if loop is not None and _genai_client_cache is not None and _genai_client_cache[0] is loop:
+        return _genai_client_cache[1]
+
+    client = genai.Client(
+        vertexai=True,
+        project=os.environ['GOOGLE_CLOUD_PROJECT'],
+        location=os.environ['GOOGLE_CLOUD_LOCATION'],
+    )
+    if loop is not None:
+        _genai_client_cache = (loop, client)
+    return client
+
+
+# Connects the interactive terminal to an asyncio StreamReader,
+# so reading user input is handled by the event loop
+# A pending read is cancelled right away on Ctrl+C (unlike input() in a worker thread)
+# Reads from a separate /dev/tty handle: the pipe transport makes its file non-blocking,
+# and doing that to stdin would also make the shared stdout/stderr non-blocking (losing output)
+# Returns (None, None) on Windows or when stdin is not a terminal (piped or redirected input)
+async def _connect_stdin() -> tuple[Optional[asyncio.StreamReader], Optional[asyncio.ReadTransport]]:
+    if sys.platform == "win32" or not sys.stdin.isatty():
+        return None, None
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    try:
+        tty = open("/dev/tty", "rb", buffering=0)
+    except OSError:
+        # no controlling terminal
+        return None, None
+    try:
+        transport, _ = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), tty)
+    except (OSError, ValueError):
+        tty.close()
+        return None, None
+    return reader, transport
+
+
+# Reads one line of user input, like input(prompt), without blocking the event loop
+# Raises EOFError when stdin is closed
+async def _read_query(reader: Optional[asyncio.StreamReader], prompt: str) -> str:
+    if reader is None:
+        # fallback: input() runs in a worker thread
+        return await asyncio.to_thread(input, prompt)
+    print(prompt, end="", flush=True)
+    line = await reader.readline()
+    if not line:
+        raise EOFError
+    return line.decode()
+
 
 # wrapper class for LLM + MCP session lifecycle
 class MCPClient:
+    # fixed attribute set: no per-instance __dict__, faster attribute access in the query loop
+    __slots__ = (
+        "session",
+        "exit_stack",
+        "gemini_model",
+        "genai_client",
+        "stdio",
+        "write",
+        "_gemini_tools",
+        "_gemini_config",
+        "_tool_sem",
+    )
+
     def __init__(self):
         # will hold the active mcp session once connected
         self.session: Optional[ClientSession] = None
         # manages cleanup of stdio connection, mcp session, backgrounf tasks etc
         self.exit_stack = AsyncExitStack()
-        #
-        self.project = os.environ['GOOGLE_CLOUD_PROJECT']
-        self.location = os.environ['GOOGLE_CLOUD_LOCATION']
+        # Gemini model name to use for generation
         self.gemini_model = os.environ['GEMINI_MODEL']
 
-        self.genai_client = genai.Client(vertexai=True, project=self.project, location=self.location)
+        # shared Vertex AI client (built once per process, see _genai_client)
+        self.genai_client = _genai_client()
+
+        # Gemini tool declarations + generation config built from the MCP tools
+        # cached once per session by refresh_tools() instead of rebuilt on every query
+        self._gemini_tools: list[types.Tool] = []
+        self._gemini_config: Optional[types.GenerateContentConfig] = None
+
+        # limits how many MCP tool calls run at once when Gemini requests many in one turn
+        self._tool_sem = asyncio.Semaphore(MAX_CONCURRENT_TOOL_CALLS)
     
     # methods will go here
     # Async method to start and connect to an MCP server over stdio
@@ -81,33 +179,34 @@ class MCPClient:
         # performs mcp handshake (capabilities exchange, tool discovery, protocol setup, etc)
         await self.session.initialize()
 
-        # List available tools
-        # ask server for its available tools
-        response = await self.session.list_tools()
-        tools = response.tools
+        # List available tools and cache them as Gemini FunctionDeclarations
+        tools = await self.refresh_tools()
         
         # confirms connection and prints available tools
         # this print is safe because this is the client, not the stdio server
         print("\nConnected to server with tools:", [tool.name for tool in tools])
 
-    
-    
-    
-    # Process a query using Vertex AI Gemini and MCP tools
-    async def process_query(self, query: str) -> str:
-        """Process a query using Vertex AI Gemini + MCP tools (loops until no more tool calls)."""
+    # Fetch MCP tools and (re)build the cached Gemini tools + config
+    # call again whenever the server sends a tools/list_changed notification
+    async def refresh_tools(self):
+        """Fetch the MCP server's tools and rebuild the cached Gemini config.
+
+        Returns:
+            The list of MCP tools reported by the server
+        """
         if not self.session:
             raise RuntimeError("Not connected to an MCP server. Call connect_to_server() first.")
 
-        # 1) Fetch MCP tools and convert them to Gemini FunctionDeclarations
+        # ask server for its available tools
         tools_resp = await self.session.list_tools()
 
+        # Convert MCP tools to Gemini FunctionDeclarations
         function_decls = []
         for t in tools_resp.tools:
             # MCP provides JSON schema in t.inputSchema -> Gemini expects parameters schema
-            params_schema = t.inputSchema or {"type": "object", "properties": {}}
-            if "type" not in params_schema:
-                params_schema["type"] = "object"
+            # copy it so the MCP tool's own schema dict is never mutated
+            params_schema = dict(t.inputSchema) if t.inputSchema else {"type": "object", "properties": {}}
+            params_schema.setdefault("type", "object")
 
             function_decls.append(
                 types.FunctionDeclaration(
@@ -117,8 +216,29 @@ class MCPClient:
                 )
             )
 
-        gemini_tools = [types.Tool(function_declarations=function_decls)]
-        config = types.GenerateContentConfig(tools=gemini_tools)
+        self._gemini_tools = [types.Tool(function_declarations=function_decls)]
+        self._gemini_config = types.GenerateContentConfig(tools=self._gemini_tools)
+
+        return tools_resp.tools
+
+    
+    
+    # Process a query using Vertex AI Gemini and MCP tools
+    async def process_query(self, query: str, on_text: Optional[Callable[[str], None]] = None) -> str:
+        """Process a query using Vertex AI Gemini + MCP tools (loops until no more tool calls).
+
+        Args:
+            query: The user's natural language query
+            on_text: Optional callback invoked with each text fragment as it is streamed
+        """
+        # connect_to_server() must have been called first (checked only in debug runs, not under python -O)
+        assert self.session is not None, "Not connected to an MCP server. Call connect_to_server() first."
+
+        # 1) Gemini tools + config are cached on connect (see refresh_tools)
+        # hoist attributes used on every loop turn into locals
+        config = self._gemini_config
+        models = self.genai_client.aio.models
+        model = self.gemini_model
 
         # 2) Conversation state for Gemini
         contents = [
@@ -129,22 +249,46 @@ class MCPClient:
 
         # 3) Tool-call loop
         while True:
-            resp = self.genai_client.models.generate_content(
-                model=self.gemini_model,
+            # Stream the response so text is available as soon as Gemini emits it
+            # async variant keeps the event loop free while Gemini is generating
+            stream = await models.generate_content_stream(
+                model=model,
                 contents=contents,
                 config=config,
             )
 
-            # Gemini responses are in candidate content parts
-            parts = (resp.candidates[0].content.parts or []) if resp.candidates else []
-
-            # Collect any text
-            for p in parts:
-                if getattr(p, "text", None):
-                    final_text_parts.append(p.text)
-
-            # Extract function calls (tool requests)
-            tool_calls = [p.function_call for p in parts if getattr(p, "function_call", None)]
+            # all parts of this model turn, accumulated across stream chunks
+            parts = []
+            turn_text: list[str] = []
+            # function calls (tool requests) found in this turn
+            tool_calls = []
+            # turns are joined with "\n" in the returned text, so separate them the same way
+            # when streaming: emit "\n" before this turn's first text if an earlier turn had text
+            needs_separator = any(t and not t.isspace() for t in final_text_parts)
+            async for chunk in stream:
+                # Gemini responses are in candidate content parts
+                candidate = chunk.candidates[0] if chunk.candidates else None
+                chunk_parts = (candidate.content.parts or []) if candidate and candidate.content else []
+                parts.extend(chunk_parts)
+
+                # Single pass over the parts: collect text and function calls together
+                # Part always defines .text and .function_call (None when unset), so no getattr needed
+                for p in chunk_parts:
+                    text = p.text
+                    if text:
+                        # hand text to the caller as it arrives
+                        turn_text.append(text)
+                        if on_text:
+                            if needs_separator:
+                                on_text("\n")
+                                needs_separator = False
+                            on_text(text)
+                    fc = p.function_call
+                    if fc:
+                        tool_calls.append(fc)
+
+            # streamed text arrives in fragments, so join this turn without separators
+            final_text_parts.append("".join(turn_text))
 
             # If no tool calls -> we are done
             if not tool_calls:
@@ -153,20 +297,30 @@ class MCPClient:
             # Add the model message that requested tools to the conversation
             contents.append(types.Content(role="model", parts=parts))
 
-            # Execute each tool call and return function responses back to Gemini
-            tool_response_parts = []
-            for fc in tool_calls:
-                tool_name = fc.name
-                tool_args = fc.args or {}
+            # Execute all tool calls concurrently so their latencies overlap
+            # return_exceptions=True keeps one failing tool from aborting the whole batch
+            # calls beyond MAX_CONCURRENT_TOOL_CALLS wait for a free slot (see _call_tool)
+            results = await asyncio.gather(
+                *(self._call_tool(fc) for fc in tool_calls),
+                return_exceptions=True,
+            )
 
-                mcp_result = await self.session.call_tool(tool_name, tool_args)
+            # Return function responses back to Gemini in the same order as the calls
+            tool_response_parts = []
+            for fc, mcp_result in zip(tool_calls, results):
+                # surface tool failures to Gemini as an error payload instead of raising
+                # BaseException also covers a cancelled call (CancelledError is not an Exception)
+                if isinstance(mcp_result, BaseException):
+                    response = {"error": str(mcp_result) or type(mcp_result).__name__}
+                else:
+                    # MCP returns a structured "content" list; pass it back as JSON-like object
+                    response = {"result": mcp_result.content}
 
-                # MCP returns a structured "content" list; pass it back as JSON-like object
                 tool_response_parts.append(
                     types.Part(
                         function_response=types.FunctionResponse(
-                            name=tool_name,
-                            response={"result": mcp_result.content},
+                            name=fc.name,
+                            response=response,
                         )
                     )
                 )
@@ -174,10 +328,66 @@ class MCPClient:
             contents.append(types.Content(role="user", parts=tool_response_parts))
 
         # Join and return the final text response if no more tool calls
-        return "\n".join([t for t in final_text_parts if t.strip()])
+        # isspace() skips whitespace-only parts without building a stripped copy of each one
+        return "\n".join(t for t in final_text_parts if t and not t.isspace())
 
 
     
+    # Process several independent queries with a single Gemini call
+    # amortises the per-call LLM overhead when the queries don't need tools
+    async def process_queries(self, queries: list[str]) -> list[str]:
+        """Answer multiple independent queries, batching them into one Gemini call when possible.
+
+        Falls back to one process_query per query (run concurrently) when Gemini
+        wants to call tools or does not return one answer per query.
+
+        Args:
+            queries: The user's natural language queries
+
+        Returns:
+            One answer per query, in the same order
+        """
+        if len(queries) < 2:
+            return [await self.process_query(q) for q in queries]
+
+        # Pack all queries into one numbered prompt asking for a JSON array of answers
+        numbered = "\n".join(f"{i}. {q}" for i, q in enumerate(queries, 1))
+        prompt = (
+            f"Answer the following {len(queries)} questions independently.\n"
+            f"Return only a JSON array of {len(queries)} strings, one answer per question, in order.\n\n"
+            f"{numbered}"
+        )
+
+        resp = await self.genai_client.aio.models.generate_content(
+            model=self.gemini_model,
+            contents=[types.Content(role="user", parts=[types.Part(text=prompt)])],
+            config=self._gemini_config,
+        )
+        parts = (resp.candidates[0].content.parts or []) if resp.candidates and resp.candidates[0].content else []
+
+        # tool calls can't be answered in a batched prompt -> no function calls means we can parse the answers
+        if not any(p.function_call for p in parts):
+            text = "".join(p.text for p in parts if p.text).strip()
+            # the model may wrap the array in a ```json code fence
+            text = text.removeprefix("```json").removeprefix("```").removesuffix("```").strip()
+            try:
+                answers = orjson.loads(text)
+            except orjson.JSONDecodeError:
+                answers = None
+
+            if isinstance(answers, list) and len(answers) == len(queries):
+                return [a if isinstance(a, str) else orjson.dumps(a).decode() for a in answers]
+
+        # Fall back to the full tool-call loop for each query, concurrently
+        return list(await asyncio.gather(*(self.process_query(q) for q in queries)))
+
+    # Execute a single Gemini function call on the MCP server
+    # the semaphore bounds how many calls are in flight on the session at once
+    async def _call_tool(self, fc: types.FunctionCall):
+        """Run one tool call through the MCP session, limited by the tool semaphore."""
+        async with self._tool_sem:
+            return await self.session.call_tool(fc.name, fc.args or {})
+
     # chat_loop method
     # runs an interactive terminal chat with the MCP client
     async def chat_loop(self):
@@ -185,24 +395,37 @@ class MCPClient:
         print("\nMCP Client Started!")
         print("Type your queries or 'quit' to exit.")
 
-        # keep the chat loop running until user types 'quit'
-        while True:
-            try:
-                # read user input from terminal
-                query = input("\nQuery: ").strip()
-
-                # exit condition
-                if query.lower() == 'quit':
-                    break
-
-                # send query to process_query method
-                # which handles LLM calls and tool executions
-                response = await self.process_query(query)
-                # print the final response to the terminal
-                print("\n" + response)
-            # catch and print any errors during processing
-            except Exception as e:
-                print(f"\nError: {str(e)}")
+        # stdin reader driven by the event loop (None -> fall back to input() in a thread)
+        reader, transport = await _connect_stdin()
+
+        try:
+            # keep the chat loop running until user types 'quit'
+            while True:
+                try:
+                    # read user input from terminal without blocking the event loop
+                    try:
+                        query = (await _read_query(reader, "\nQuery: ")).strip()
+                    except EOFError:
+                        # stdin closed (Ctrl+D or end of piped input) -> exit cleanly
+                        break
+
+                    # exit condition
+                    if query.lower() == 'quit':
+                        break
+
+                    # send query to process_query method
+                    # which handles LLM calls and tool executions
+                    # the response is streamed to the terminal as Gemini generates it
+                    print()
+                    await self.process_query(query, on_text=lambda text: print(text, end="", flush=True))
+                    print()
+                # catch and print any errors during processing
+                except Exception as e:
+                    print(f"\nError: {str(e)}")
+        finally:
+            # closes the /dev/tty handle used for reading input
+            if transport is not None:
+                transport.close()
     
     # cleanup method
     async def cleanup(self):
@@ -238,7 +461,9 @@ async def main():
         await client.cleanup()
 
 if __name__ == "__main__":
-    import sys
+    # use uvloop for the event loop created by asyncio.run when installed
+    if uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
     asyncio.run(main())
 
 
@@ -1,18 +1,59 @@
+# Needed to configure the event loop policy and to run NWS requests concurrently
+import asyncio
+
+# Used to read stdin and detect the platform for the stdio transport
+import sys
+# Used to check whether stdin is a pipe
+import stat
+
+# Used for expiry timestamps in the forecast URL cache
+import time
+
+# Used to place the HTTP cache database in the per-user cache directory
+import os
+from pathlib import Path
+
+# Logging goes to stderr, which is safe for a stdio MCP server (stdout carries JSON-RPC)
+import logging
+
 # Used for type hints (Any means "this value can be of any type")
-from typing import Any
+# Annotated + pydantic Field add validation constraints to tool arguments
+from typing import Annotated, Any
+
+from pydantic import Field
+
+# Used for the bounded (LRU) forecast URL cache
+from collections import OrderedDict
+
+# Used to build the server lifespan (startup/shutdown hook)
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
 
 # Async HTTP client library, httpx installed using uv add MCP-httpx
 # Used to call external APIs (here, the National Weather Service API)
 import httpx
 
+# Fast JSON parser, used to decode the (often large) NWS GeoJSON responses
+import orjson
+
+# HTTP caching for httpx (RFC 9111): honours NWS Cache-Control and revalidates with ETags
+import hishel
+from hishel.httpx import AsyncCacheClient
+
 # Import FastMCP server class from MCP-server-fastmcp package, a high lever MCP server framework for building MCP servers easily
 # Handles JSON-RPC requests and responses, Tools, Lifecycles, etc.
 from mcp.server.fastmcp import FastMCP
 
-# Initialize FastMCP server
-# The string "weather" is the name of this MCP server
-# This object will register tools and handle incoming MCP requests
-mcp = FastMCP("weather")
+# anyio runs the server (same as mcp.run), stdio_server is the MCP stdio transport
+import anyio
+from mcp.server.stdio import stdio_server
+
+# Optional faster event loop (libuv based) for all async I/O
+# Not available on Windows, falls back to the default asyncio loop there
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
 
 
 # Constants
@@ -20,46 +61,190 @@ mcp = FastMCP("weather")
 NWS_API_BASE = "https://api.weather.gov"
 # Required HTTP header for NWS API requests
 USER_AGENT = "weather-app/1.0"
+# Read MCP messages from stdin through an asyncio pipe instead of a worker thread
+# The default stdio transport runs every blocking readline() in a thread
+# Windows has no pipe transport for stdin, so it keeps the default transport
+USE_PIPE_STDIN = sys.platform != "win32"
+# Max size of one JSON-RPC message line read from stdin (asyncio defaults to 64 KiB)
+STDIN_LINE_LIMIT = 16 * 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+# Settings shared by the cached and the plain NWS HTTP client
+# Reusing one client keeps connections alive between tool calls,
+# so repeat requests skip DNS resolution, TCP handshake and TLS negotiation
+# http2=True multiplexes concurrent requests (e.g. /points + forecast) over one connection
+# Required headers for NWS API requests
+# User-Agent: NSW API requires a User-Agent header to identify the application making the request
+# Accept: application/geo+json indicates we want the response in GeoJSON format
+# Accept-Encoding: GeoJSON compresses very well, ask for brotli or gzip compressed bodies
+_NWS_CLIENT_OPTIONS: dict[str, Any] = {
+    "headers": {
+        "User-Agent": USER_AGENT,
+        "Accept": "application/geo+json",
+        "Accept-Encoding": "br, gzip",
+    },
+    "http2": True,
+    "timeout": 30.0,
+    "limits": httpx.Limits(max_keepalive_connections=20, max_connections=50),
+}
+
+# Shared async HTTP client for all NWS requests, created on first use (see _get_nws_client)
+_NWS_CLIENT: httpx.AsyncClient | None = None
+
+
+# SQLite file backing the NWS HTTP cache
+# Lives in the per-user cache directory ($XDG_CACHE_HOME or ~/.cache), never in a shared
+# location or the working directory (the client spawns this server in the user's project)
+def _nws_cache_path() -> Path:
+    return Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "weather-mcp" / "nws_cache.db"
+
+
+# Builds the shared NWS client
+# Responses are cached according to the NWS Cache-Control headers:
+# fresh responses are served without a request, stale ones are revalidated (ETag -> 304)
+# The cache is optional: if its directory can't be created, fall back to an uncached client
+def _get_nws_client() -> httpx.AsyncClient:
+    """Return the shared NWS HTTP client, creating it on first use."""
+    global _NWS_CLIENT
+    if _NWS_CLIENT is not None:
+        return _NWS_CLIENT
+
+    try:
+        cache_path = _nws_cache_path()
+        # hishel does not create the parent directory, so make sure it exists
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+    except (OSError, RuntimeError) as e:
+        # RuntimeError: no home directory to put the cache in
+        logger.warning("NWS HTTP cache disabled, can't create cache directory: %s", e)
+        _NWS_CLIENT = httpx.AsyncClient(**_NWS_CLIENT_OPTIONS)
+    else:
+        _NWS_CLIENT = AsyncCacheClient(
+            storage=hishel.AsyncSqliteStorage(database_path=cache_path),
+            # private cache: this server is the only consumer of the cached responses
+            policy=hishel.SpecificationPolicy(cache_options=hishel.CacheOptions(shared=False)),
+            **_NWS_CLIENT_OPTIONS,
+        )
+    return _NWS_CLIENT
+
+
+# Server lifespan: runs once when the server starts and once when it shuts down
+# Closes the shared HTTP client (and its pooled connections) on shutdown
+@asynccontextmanager
+async def lifespan(server: FastMCP) -> AsyncIterator[None]:
+    """Close the shared NWS HTTP client when the server stops."""
+    try:
+        yield
+    finally:
+        if _NWS_CLIENT is not None:
+            await _NWS_CLIENT.aclose()
+
+
+# Initialize FastMCP server
+# The string "weather" is the name of this MCP server
+# This object will register tools and handle incoming MCP requests
+mcp = FastMCP("weather", lifespan=lifespan)
+
 
 # Function to make requests to the NWS API
 # Fetches data from NSW API endpoints and returns JSON responses IF successful (else None)
 async def make_nws_request(url: str) -> dict[str, Any] | None:
     """Make a request to the NWS API with proper error handling."""
-    # Required headers for NWS API requests
-    # User-Agent: NSW API requires a User-Agent header to identify the application making the request
-    # Accept: application/geo+json indicates we want the response in GeoJSON format
-    headers = {"User-Agent": USER_AGENT, "Accept": "application/geo+json"}
-    # Creates an asynchronous HTTP client session
-    # Non -blocking, allowing other operations to run while waiting for the response
-    # Automatically closes the client session after the request is complete
-    async with httpx.AsyncClient() as client:
-        try:
-            # Make GET request to the specified URL with headers and a timeout of 30 seconds
-            response = await client.get(url, headers=headers, timeout=30.0)
-            # Raise an exception for HTTP error responses (4xx and 5xx status codes)
-            response.raise_for_status()
-            # If the request is successful, return the JSON response
-            return response.json()
-        except Exception:
-            # If any error occurs (network issues, invalid responses, etc.), return None
-            # Fails safely without crashing the application
-            return None
+    try:
+        # Make GET request to the specified URL using the shared client
+        # Non-blocking, allowing other operations to run while waiting for the response
+        # Headers and the 30 second timeout are configured on the client itself
+        response = await _get_nws_client().get(url)
+        # Raise an exception for HTTP error responses (4xx and 5xx status codes)
+        response.raise_for_status()
+        # If the request is successful, return the parsed JSON response
+        return orjson.loads(response.content)
+    except httpx.HTTPStatusError as e:
+        # NWS answered with an error status (e.g. unknown location), return None
+        logger.warning("NWS request to %s failed with status %s", url, e.response.status_code)
+        return None
+    except Exception:
+        # If any other error occurs (network issues, cache storage, invalid responses, etc.), return None
+        # Fails safely without crashing the application, but logs why
+        logger.exception("NWS request to %s failed", url)
+        return None
+
+
+# Cache of NWS grid lookups: rounded (latitude, longitude) -> (forecast URL, expiry time)
+# The points -> forecast URL mapping is stable per ~2.5 km grid cell,
+# so repeated or nearby forecast queries can skip the /points request
+# OrderedDict kept in least -> most recently used order, so the oldest entry is evicted first
+_POINTS_CACHE: OrderedDict[tuple[float, float], tuple[str, float]] = OrderedDict()
+# How long a cached forecast URL stays valid (24 hours, in seconds)
+_POINTS_CACHE_TTL = 24 * 60 * 60
+# Max number of grid cells kept in memory
+_POINTS_CACHE_MAX_SIZE = 1024
+
+
+# Resolves the forecast URL for a location, using the points cache when possible
+# Returns None if the NWS /points request fails
+async def get_forecast_url(latitude: float, longitude: float) -> str | None:
+    """Look up the NWS forecast URL for a location, with caching."""
+    # 2 decimal places is ~1 km, well inside a single NWS grid cell
+    key = (round(latitude, 2), round(longitude, 2))
+    now = time.monotonic()
+
+    # Cache hit that has not expired yet -> mark it as most recently used
+    cached = _POINTS_CACHE.get(key)
+    if cached:
+        if cached[1] > now:
+            _POINTS_CACHE.move_to_end(key)
+            return cached[0]
+        # expired entry, drop it and fetch again
+        del _POINTS_CACHE[key]
+
+    # Cache miss: get the forecast grid endpoint from NWS
+    points_url = f"{NWS_API_BASE}/points/{latitude},{longitude}"
+    # Gets Metadata about the location, including forecast URLs
+    points_data = await make_nws_request(points_url)
+
+    if not points_data:
+        return None
+
+    # Get the forecast URL from the points response and cache it
+    forecast_url = points_data["properties"]["forecast"]
+    _POINTS_CACHE[key] = (forecast_url, now + _POINTS_CACHE_TTL)
+    # evict least recently used entries beyond the size cap
+    while len(_POINTS_CACHE) > _POINTS_CACHE_MAX_SIZE:
+        _POINTS_CACHE.popitem(last=False)
+    return forecast_url
+
+
+# Output templates, built once at import time and filled with str.format_map
+# Alert fields fall back to _ALERT_DEFAULTS when missing from the NWS response
+_ALERT_TMPL = """
+Event: {event}
+Area: {areaDesc}
+Severity: {severity}
+Description: {description}
+Instructions: {instruction}
+"""
+_ALERT_DEFAULTS = {
+    "event": "Unknown",
+    "areaDesc": "Unknown",
+    "severity": "Unknown",
+    "description": "No description available",
+    "instruction": "No specific instructions provided",
+}
+_FORECAST_TMPL = """
+{name}:
+Temperature: {temperature}°{temperatureUnit}
+Wind: {windSpeed} {windDirection}
+Forecast: {detailedForecast}
+"""
 
 
 # Converts raw alert data from NWS API into a human-readable format
 def format_alert(feature: dict) -> str:
     """Format an alert feature into a readable string."""
-    # Extract properties from the alert feature
-    props = feature["properties"]
-    # Return a formatted string with alert details
-    # Uses get() method to safely access dictionary keys with default values
-    return f"""
-Event: {props.get("event", "Unknown")}
-Area: {props.get("areaDesc", "Unknown")}
-Severity: {props.get("severity", "Unknown")}
-Description: {props.get("description", "No description available")}
-Instructions: {props.get("instruction", "No specific instructions provided")}
-"""
+    # Fill the alert template from the feature properties
+    # properties override the defaults, so missing keys get a safe fallback value
+    return _ALERT_TMPL.format_map({**_ALERT_DEFAULTS, **feature["properties"]})
 
 # @mcp.tool decorator registers the function as a mcp tool in the MCP server
 # exposes to clients/llm
@@ -87,10 +272,8 @@ async def get_alerts(state: str) -> str:
         return "No active alerts for this state."
     
     # converts raw alert json data into human-readable format
-    alerts = [format_alert(feature) for feature in data["features"]]
-    
     # returns all aerts as a single formatted string separated by "---"
-    return "\n---\n".join(alerts)
+    return "\n---\n".join(format_alert(feature) for feature in data["features"])
 
 
 
@@ -104,16 +287,11 @@ async def get_forecast(latitude: float, longitude: float) -> str:
         latitude: Latitude of the location
         longitude: Longitude of the location
     """
-    # First get the forecast grid endpoint
-    points_url = f"{NWS_API_BASE}/points/{latitude},{longitude}"
-    # Gets Metadata about the location, including forecast URLs
-    points_data = await make_nws_request(points_url)
+    # First get the forecast grid endpoint (cached per grid cell)
+    forecast_url = await get_forecast_url(latitude, longitude)
 
-    if not points_data:
+    if not forecast_url:
         return "Unable to fetch forecast data for this location."
-
-    # Get the forecast URL from the points response
-    forecast_url = points_data["properties"]["forecast"]
     
     # Fetch the detailed forecast data
     forecast_data = await make_nws_request(forecast_url)
@@ -124,19 +302,81 @@ async def get_forecast(latitude: float, longitude: float) -> str:
     # Format the periods into a readable forecast
     # Forecast broken down into time periods (e.g., "Tonight", "Monday", etc.)
     periods = forecast_data["properties"]["periods"]
-    forecasts = []
-    # Only show next 5 periods
-    for period in periods[:5]:  
-        forecast = f"""
-{period["name"]}:
-Temperature: {period["temperature"]}°{period["temperatureUnit"]}
-Wind: {period["windSpeed"]} {period["windDirection"]}
-Forecast: {period["detailedForecast"]}
-"""
-        forecasts.append(forecast)
 
+    # Only show next 5 periods
     # return all forecasts as a single formatted string separated by "---"
-    return "\n---\n".join(forecasts)
+    return "\n---\n".join(_FORECAST_TMPL.format_map(period) for period in periods[:5])
+
+
+# A single [latitude, longitude] pair, validated by the MCP framework (minItems/maxItems = 2)
+LatLon = Annotated[list[float], Field(min_length=2, max_length=2)]
+# Max number of locations per batch call, so one call can't flood the NWS API
+MAX_BATCH_LOCATIONS = 10
+
+
+@mcp.tool()
+# Tool to fetch weather forecasts for several locations in a single call
+async def get_forecasts_batch(
+    locations: Annotated[list[LatLon], Field(min_length=1, max_length=MAX_BATCH_LOCATIONS)],
+) -> str:
+    """Get weather forecasts for multiple locations at once.
+
+    Args:
+        locations: List of up to 10 [latitude, longitude] pairs, e.g. [[37.77, -122.42], [40.71, -74.01]]
+    """
+    # Fetch every location concurrently, so total latency is roughly that of the slowest one
+    forecasts = await asyncio.gather(
+        *(get_forecast(latitude, longitude) for latitude, longitude in locations)
+    )
+
+    # label each forecast with its location and separate locations with "==="
+    return "\n===\n".join(
+        f"Location {latitude}, {longitude}:\n{forecast}"
+        for (latitude, longitude), forecast in zip(locations, forecasts)
+    )
+
+# Decodes the raw stdin lines into the str lines the MCP stdio transport expects
+async def _decode_lines(reader: asyncio.StreamReader) -> AsyncIterator[str]:
+    async for line in reader:
+        yield line.decode("utf-8")
+
+
+# Whether stdin is a pipe or socket (how MCP clients connect to a stdio server)
+# Only these are safe for connect_read_pipe: a regular file or /dev/null can't be watched
+# by epoll (the error only shows up after connect_read_pipe returns, or aborts under uvloop),
+# and a terminal would have its shared file description (incl. stdout) made non-blocking
+def _stdin_is_pipe() -> bool:
+    try:
+        mode = os.fstat(sys.stdin.fileno()).st_mode
+    except (OSError, ValueError):
+        return False
+    return stat.S_ISFIFO(mode) or stat.S_ISSOCK(mode)
+
+
+# Runs the MCP server over stdio, reading stdin through an asyncio StreamReader
+# Same as mcp.run(transport="stdio"), but stdin reads are handled by the event loop
+# instead of a thread per readline()
+# Mirrors FastMCP.run_stdio_async from mcp 1.25.0 (incl. the private mcp._mcp_server);
+# pyproject pins mcp < 2, recheck this copy against run_stdio_async when upgrading
+async def run_stdio_pipe() -> None:
+    """Run the server over stdio with a pipe-backed stdin reader."""
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=STDIN_LINE_LIMIT)
+    try:
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin.buffer)
+    except (OSError, ValueError):
+        # the event loop can't watch this pipe -> default transport
+        await mcp.run_stdio_async()
+        return
+
+    # stdout keeps the default writer, only stdin is replaced
+    async with stdio_server(stdin=_decode_lines(reader)) as (read_stream, write_stream):
+        await mcp._mcp_server.run(
+            read_stream,
+            write_stream,
+            mcp._mcp_server.create_initialization_options(),
+        )
+
 
 # Entry point to run the MCP server
 def main():
@@ -145,7 +385,14 @@ def main():
     # designed for local tools, clis and mcp clients
     # json rpc requests and responses are sent over stdio streams
     # when using stdio never print to stdout directly as it will interfere with the mcp protocol
-    mcp.run(transport="stdio")
+    # mcp.run / anyio.run create their own event loop, so install uvloop through the loop policy
+    if uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    # stdin that isn't a pipe/socket (file, /dev/null, terminal) uses the default transport
+    if USE_PIPE_STDIN and _stdin_is_pipe():
+        anyio.run(run_stdio_pipe)
+    else:
+        mcp.run(transport="stdio")
 
 
 # ensure main() is called when this script is executed directly